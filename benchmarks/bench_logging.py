@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""
+@File    :   bench_logging.py
+@Time    :   2026/10/19 19:30:00
+@Author  :   Ayatale
+@Version :   1.0
+@Contact :   ayatale@qq.com
+@Github  :   https://github.com/brx86/
+@Desc    :   测量每条消息的日志开销：f-string 与延迟格式化、是否采样、是否写入 json 日志文件
+             例: python benchmarks/bench_logging.py -n 20000
+             文件写入在后台线程中进行，表中为消息处理协程所承担的开销
+"""
+
+import argparse
+import os
+import sys
+import types
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from loguru import logger
+
+# utils/__init__ 会读取 config.toml，这里只加载 utils.log
+utils = types.ModuleType("utils")
+utils.__path__ = [str(Path(__file__).parents[1] / "utils")]
+sys.modules.setdefault("utils", utils)
+
+from utils.log import Sampler, add_sinks  # noqa: E402
+
+FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level}</level>\t| {message}"
+GROUP, USER, MSG = 123456789, 12345678, "[CQ:at,qq=10001] 今晚吃什么 [CQ:face,id=14]"
+
+
+def eager(sampler):
+    if sampler is None or sampler(GROUP):
+        logger.info(f"<- Group {GROUP}-{USER}: {MSG}")
+
+
+def lazy(sampler):
+    if sampler is None or sampler(GROUP):
+        logger.info("<- Group {group}-{user}: {msg}", group=GROUP, user=USER, msg=MSG)
+
+
+def measure(func, sampler, n: int) -> float:
+    start = perf_counter()
+    for _ in range(n):
+        func(sampler)
+    return (perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志开销测试")
+    parser.add_argument("-n", type=int, default=20000, help="每项记录的消息数")
+    args = parser.parse_args()
+    with TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        sinks = {
+            "filtered (WARNING)": ("WARNING", ""),
+            "terminal INFO": ("INFO", ""),
+            "terminal + json file": ("INFO", f"{tmp}/bench.log"),
+        }
+        print(f"{'sinks':24}{'style':8}{'sampling':>10}{'us/msg':>10}")
+        for sink, (level, file) in sinks.items():
+            add_sinks(FORMAT, level, file, "INFO", stream=devnull)
+            for func in (eager, lazy):
+                for sampling in (False, True):
+                    sampler = Sampler(5, 10) if sampling else None
+                    cost = measure(func, sampler, args.n)
+                    on = "on" if sampling else "off"
+                    print(f"{sink:24}{func.__name__:8}{on:>10}{cost:10.2f}")
+            logger.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""
+@File    :   bench_render.py
+@Time    :   2026/10/19 18:10:00
+@Author  :   Ayatale
+@Version :   1.0
+@Contact :   ayatale@qq.com
+@Github  :   https://github.com/brx86/
+@Desc    :   对比重构前的 f-string 拼接与 Renderer 的渲染耗时
+             例: python benchmarks/bench_render.py -n 20000
+"""
+
+import argparse
+import re
+import sys
+import types
+from pathlib import Path
+from timeit import timeit
+
+# utils/__init__ 会读取 config.toml，这里只加载 utils.render
+utils = types.ModuleType("utils")
+utils.__path__ = [str(Path(__file__).parents[1] / "utils")]
+sys.modules.setdefault("utils", utils)
+
+from utils.render import Renderer  # noqa: E402
+
+NAME = "Ayatale.moe [bot]"
+SEGMENTS = ["早上好 ", "@群主 ", "/微笑 ", "看看这个 https://example.com/a_b?c=1 ", "!!"]
+URLS = ["https://gchat.qpic.cn/gchatpic_new/0/0-0-ABC/0?term=2"] * 2
+
+
+def escaped_md(text: str = "", extra: bool = False) -> str:
+    escape_chars = r"\_*[]()~`>#+-=|{}.!"
+    new_text = re.sub(f"([{re.escape(escape_chars)}])", r"\\\1", text)
+    return new_text.strip().replace(".", "·") if extra is True else new_text
+
+
+def old_render(segments: list[str]) -> list[str]:
+    """重构前 forward_to_tg/create_msg 的渲染方式"""
+    user_name = escaped_md(NAME, extra=True)
+    text, result = "", []
+    for seg in segments:
+        text = f"{text}{seg}"
+    for img in URLS:
+        result.append(f"*{user_name}*: [⁣⁣⁣图片]({img})")
+    result.append(f"*{user_name}*:\n{escaped_md(text)}")
+    return result
+
+
+def new_render(segments: list[str], entities: bool = False) -> list[dict]:
+    renderer = Renderer(NAME, entities)
+    result = [renderer.image(img) for img in URLS]
+    return result + renderer.text("".join(segments))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="渲染性能测试")
+    parser.add_argument("-n", type=int, default=20000, help="每项的执行次数")
+    args = parser.parse_args()
+    long = SEGMENTS * 400
+    cases = {
+        "old f-string": lambda: old_render(SEGMENTS),
+        "Renderer markdown": lambda: new_render(SEGMENTS),
+        "Renderer entities": lambda: new_render(SEGMENTS, True),
+        "old f-string (long, unsplit)": lambda: old_render(long),
+        "Renderer markdown (long, split)": lambda: new_render(long),
+    }
+    for name, func in cases.items():
+        n = args.n if "long" not in name else args.n // 100
+        print(f"{name:34}{timeit(func, number=n) / n * 1e6:10.2f} us/msg")
+
+
+if __name__ == "__main__":
+    main()
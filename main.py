@@ -12,7 +12,7 @@
 
 import asyncio
 
-from utils import conf, logger, Qbot, Tbot
+from utils import breakers, conf, logger, recorder, transfers, Qbot, Tbot
 
 
 @logger.catch
@@ -22,18 +22,28 @@ async def main():
     loop = asyncio.get_event_loop()
     loop.create_task(tbot.run())
     loop.create_task(qbot.run())
+    loop.create_task(recorder.flush_loop())
     while True:
         try:
             cmd = await loop.run_in_executor(None, input, ">")
-            match cmd:
-                case "h" | "help":
-                    logger.warning("Commands: help, config, exit")
-                case "c" | "config":
+            match cmd.split():
+                case ["h" | "help"]:
+                    logger.warning(
+                        "Commands: help, config, breaker, transfer, cancel <id>, exit"
+                    )
+                case ["c" | "config"]:
                     logger.warning(conf)
-                case "q" | "quit" | "exit":
+                case ["b" | "breaker"]:
+                    logger.warning("\n{}", breakers)
+                case ["t" | "transfer"]:
+                    logger.warning("\n{}", transfers)
+                case ["x" | "cancel", job_id] if job_id.isdigit():
+                    logger.warning("Cancel: {}", transfers.cancel(int(job_id)))
+                case ["q" | "quit" | "exit"]:
                     raise EOFError
         except (KeyboardInterrupt, EOFError):
             logger.warning("Exiting...")
+            recorder.close()
             return
 
 
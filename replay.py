@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+"""
+@File    :   replay.py
+@Time    :   2026/10/19 15:20:00
+@Author  :   Ayatale
+@Version :   1.0
+@Contact :   ayatale@qq.com
+@Github  :   https://github.com/brx86/
+@Desc    :   回放 record_file 录制的数据，gocqhttp 与 telegram 均为本地桩，用于压测与性能分析
+             例: python replay.py logs/capture.jsonl.gz --speed 10 --profile replay.prof
+             也可配合 py-spy 使用: py-spy record -o replay.svg -- python replay.py ...
+             对比不同 --log-level/--log-file-level 的回放速度可得到日志在整条链路中的开销，
+             单独的日志开销测试见 benchmarks/bench_logging.py
+"""
+
+import argparse
+import asyncio
+import cProfile
+import json
+from itertools import count
+from time import perf_counter
+from types import SimpleNamespace
+
+from telegram import Update
+
+from utils import conf, logger, recorder, transfers, Qbot, Tbot
+from utils.record import read_records
+from utils.tools import setup_logger
+
+
+# 桩生成的消息 id 从 int32 范围之外开始，不会与录制数据中的真实 id 冲突
+STUB_ID = 2**31
+
+
+class StubBot:
+    """模拟 telegram Bot 的本地桩"""
+
+    ids = count(STUB_ID)
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+
+    async def call(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return SimpleNamespace(message_id=next(self.ids))
+
+    async def send_message(self, *args, **kwargs):
+        return await self.call()
+
+    async def edit_message_text(self, **kwargs):
+        return await self.call()
+
+    async def delete_message(self, **kwargs):
+        return await self.call()
+
+    async def send_document(self, **kwargs):
+        return await self.call()
+
+    async def get_file(self, file_id: str):
+        r = await self.call()
+        r.file_path = f"{conf.tg_api[:-3]}file/bot{conf.tg_token}/{file_id}"
+        return r
+
+
+class StubQbot(Qbot):
+    """模拟 gocqhttp http api 的本地桩"""
+
+    ids = count(STUB_ID)
+
+    def __init__(self, latency: float = 0):
+        super().__init__(conf.qq_ws, conf.qq_http)
+        self.latency = latency
+
+    async def post_to_qq(self, method: str, kwargs: dict) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        match method:
+            case "send_msg":
+                return {"retcode": 0, "data": {"message_id": next(self.ids)}}
+            case "get_group_member_info":
+                return {"retcode": 0, "data": {"nickname": str(kwargs["user_id"])}}
+            case "get_msg":
+                return {}
+        return {"retcode": 0, "data": {}}
+
+
+async def replay(path: str, speed: float, latency: float):
+    """按录制的时间间隔回放数据
+
+    Args:
+        path (str): 录制文件路径
+        speed (float): 回放倍速，为 0 时不等待，全速回放
+        latency (float): 本地桩每次调用的模拟延迟，单位为秒
+    """
+    qbot, tbot = StubQbot(latency), Tbot(conf.tg_token, conf.tg_api)
+    qbot.tg = tbot.bot = StubBot(latency)
+    tbot.qq = StubQbot(latency)
+    tasks, start, first, n = set(), perf_counter(), None, 0
+    for n, record in enumerate(read_records(path), 1):
+        first = first or record["t"]
+        delay = (record["t"] - first) / speed - (perf_counter() - start) if speed else 0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if record["src"] == "qq":
+            task = qbot.on_message(json.dumps(record["data"]))
+        elif (update := Update.de_json(record["data"], None)) and (
+            m := update.message or update.edited_message
+        ):
+            task = tbot.on_message(tbot.bot, m, bool(update.edited_message))
+        else:
+            continue
+        tasks.add(t := asyncio.create_task(task))
+        t.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+    elapsed = perf_counter() - start
+    logger.success(
+        "Replayed {} records in {:.2f}s ({:.1f}/s, {:.1f}us/record)",
+        n,
+        elapsed,
+        n / elapsed,
+        elapsed / max(n, 1) * 1e6,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放 record_file 录制的数据")
+    parser.add_argument("path", help="录制文件路径")
+    parser.add_argument("--speed", type=float, default=1, help="回放倍速，0 为全速")
+    parser.add_argument("--latency", type=float, default=0, help="桩调用延迟(ms)")
+    parser.add_argument("--profile", help="输出 cProfile 统计文件的路径")
+    parser.add_argument("--log-level", help="终端日志等级，默认使用配置文件")
+    parser.add_argument("--log-file-level", help="日志文件等级，OFF 为不写入文件")
+    args = parser.parse_args()
+    recorder.close()
+    transfers.max_size = 0
+    setup_logger(
+        args.log_level or conf.log_level, args.log_file_level or conf.log_file_level
+    )
+    coro = replay(args.path, args.speed, args.latency / 1000)
+    if not args.profile:
+        return asyncio.run(coro)
+    with cProfile.Profile() as profiler:
+        asyncio.run(coro)
+    profiler.dump_stats(args.profile)
+    logger.success("Profile saved to '{}'", args.profile)
+
+
+if __name__ == "__main__":
+    main()
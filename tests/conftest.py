@@ -0,0 +1,24 @@
+"""utils/__init__ 会读取 config.toml，测试中只按需加载 utils 的子模块"""
+
+import sys
+import types
+from importlib import import_module
+from pathlib import Path
+from unittest import mock
+
+import pytest
+import toml
+
+ROOT = Path(__file__).parents[1]
+utils = types.ModuleType("utils")
+utils.__path__ = [str(ROOT / "utils")]
+sys.modules.setdefault("utils", utils)
+
+
+@pytest.fixture(scope="session")
+def tools():
+    """以 example_config.toml 加载 utils.tools，不写入日志文件"""
+    raw_conf = toml.load(ROOT / "example_config.toml")
+    raw_conf["log_file_level"] = "OFF"
+    with mock.patch("toml.load", return_value=raw_conf):
+        return import_module("utils.tools")
@@ -0,0 +1,108 @@
+import asyncio
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+
+from utils.breaker import Breakers, Outbox
+from utils.models import Circuit
+
+
+def fail(breakers: Breakers, *names: str):
+    with pytest.raises(TimeoutError):
+        with breakers.track(*names):
+            raise TimeoutError
+
+
+def test_trip_and_probe(monkeypatch):
+    breakers = Breakers(Circuit(min_calls=2, reset_timeout=30))
+    fail(breakers, "qq/get_msg", "qq")
+    assert breakers.allow("qq/get_msg", "qq")
+    fail(breakers, "qq/get_msg", "qq")
+    assert breakers["qq"].state == "open"
+    assert not breakers.allow("qq/send_msg", "qq")
+    now = breakers["qq"].opened_at + 31
+    monkeypatch.setattr("utils.breaker.time", lambda: now)
+    assert breakers.allow("qq")
+    assert not breakers.allow("qq")
+    with breakers.track("qq"):
+        pass
+    assert breakers["qq"].state == "closed"
+
+
+def test_slow_and_ignore(monkeypatch):
+    breakers = Breakers(Circuit(min_calls=1, slow_call=5))
+    ticks = count(0, 10)
+    monkeypatch.setattr("utils.breaker.perf_counter", lambda: next(ticks))
+    with breakers.track("qq/upload", slow=False):
+        pass
+    assert breakers["qq/upload"].state == "closed"
+    with pytest.raises(ValueError):
+        with breakers.track("tg", ignore=(ValueError,)):
+            raise ValueError
+    assert breakers["tg"].state == "open"
+
+
+def test_outbox_terminal_and_retries():
+    breakers = Breakers(Circuit(retries=3))
+    calls = []
+
+    async def send(kwargs: dict):
+        calls.append(kwargs["n"])
+        if kwargs["n"] == 1:
+            raise PermissionError
+        if kwargs["n"] == 2:
+            raise ConnectionError
+        return kwargs["n"]
+
+    async def run():
+        outbox = Outbox(breakers, ("tg",), send, terminal=(PermissionError,))
+        return await asyncio.gather(*(outbox.put({"n": n}) for n in (1, 2, 3)))
+
+    assert asyncio.run(run()) == [None, None, 3]
+    assert calls == [1, 2, 2, 2, 3]
+
+
+def test_outbox_full():
+    breakers = Breakers(Circuit(queue_size=1))
+    breakers["tg"].trip()
+
+    async def run():
+        outbox = Outbox(breakers, ("tg",), lambda kwargs: asyncio.sleep(0))
+        waiting = asyncio.create_task(outbox.put({}))
+        await asyncio.sleep(0)
+        assert await outbox.put({}) is None
+        waiting.cancel()
+
+    asyncio.run(run())
+
+
+def test_send_keeps_order(tools, monkeypatch):
+    from utils import qq
+
+    breakers = Breakers(Circuit(reset_timeout=0))
+    monkeypatch.setattr(qq, "breakers", breakers)
+    sleep = asyncio.sleep
+    monkeypatch.setattr("utils.breaker.asyncio.sleep", lambda _: sleep(0))
+    sent = []
+
+    class Bot:
+        async def send_message(self, **kwargs):
+            sent.append(kwargs["text"])
+            return SimpleNamespace(message_id=len(sent))
+
+    async def run():
+        bot = qq.Qbot(tools.conf.qq_ws, tools.conf.qq_http)
+        bot.tg = Bot()
+        breakers["tg"].trip()
+        breakers["tg"].opened_at += 60
+        queued = asyncio.create_task(bot.send_to_tg(text="old"))
+        await asyncio.sleep(0)
+        assert bot.tg_outbox.pending == 1
+        breakers["tg"].close()
+        await bot.send_to_tg(text="new")
+        await queued
+        assert bot.tg_outbox.pending == 0
+
+    asyncio.run(run())
+    assert sent == ["old", "new"]
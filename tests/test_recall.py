@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+
+
+class StubBot:
+    def __init__(self):
+        self.calls = []
+
+    async def edit_message_text(self, **kwargs):
+        self.calls.append(("edit_message_text", kwargs))
+
+    async def delete_message(self, **kwargs):
+        self.calls.append(("delete_message", kwargs))
+
+
+@pytest.fixture
+def qbot(tools, monkeypatch):
+    from utils import qq
+
+    db = tools.Database(snapshot_size=2)
+    monkeypatch.setattr(qq, "db", db)
+    monkeypatch.setattr(tools.conf, "anti_recall", True)
+    monkeypatch.setattr(tools.conf, "tg_entities", False)
+    bot = qq.Qbot(tools.conf.qq_ws, tools.conf.qq_http)
+    bot.tg, bot.db, bot.msg = StubBot(), db, {}
+
+    async def get_msg(message_id: int):
+        return {"data": bot.msg} if bot.msg else {}
+
+    bot.get_msg = get_msg
+    return bot
+
+
+def recall(qbot, qq_msgid: int):
+    asyncio.run(qbot.recall_msg(qq_msgid))
+    return qbot.tg.calls
+
+
+def test_snapshot_eviction(tools):
+    db = tools.Database(snapshot_size=2)
+    db.save(1, [{"type": "text", "data": {"text": "a"}}], {"text": "a"})
+    db.save(2, [], origin="tg")
+    db.save(1, [], {"text": "b"})
+    db.save(3, [])
+    assert list(db.snapshot) == [1, 3]
+    assert db.load(1) == ([], {"text": "b"}, "qq")
+    assert db.load(2) == ([], {}, "")
+
+
+def test_recall_strikes_rendered(qbot):
+    qbot.db.set((55, -100), 1)
+    qbot.db.save(1, [{"type": "text", "data": {"text": "hi"}}], {"text": "*a*:\nhi"})
+    assert recall(qbot, 1) == [
+        (
+            "edit_message_text",
+            {
+                "chat_id": -100,
+                "message_id": 55,
+                "text": "~*a*:\nhi~",
+                "parse_mode": "MarkdownV2",
+            },
+        )
+    ]
+
+
+def test_recall_skips_tg_origin(qbot):
+    qbot.db.set((55, -100), 1)
+    qbot.db.save(1, [{"type": "text", "data": {"text": "hi"}}], origin="tg")
+    assert recall(qbot, 1) == []
+
+
+def test_recall_rebuilds_evicted(qbot):
+    qbot.db.set((55, -100), 1)
+    qbot.msg = {
+        "sender": {"card": "a", "nickname": "b"},
+        "message": [{"type": "text", "data": {"text": "hi!"}}],
+    }
+    [(method, kwargs)] = recall(qbot, 1)
+    assert method == "edit_message_text"
+    assert kwargs["text"] == "~*a*:\nhi\\!~"
+
+
+def test_recall_keeps_evicted_image(qbot):
+    qbot.db.set((55, -100), 1)
+    qbot.msg = {
+        "sender": {"nickname": "a"},
+        "message": [{"type": "image", "data": {"url": "https://example.com/1"}}],
+    }
+    [(method, kwargs)] = recall(qbot, 1)
+    assert method == "edit_message_text"
+    assert "https://example.com/1" in kwargs["text"]
+    qbot.tg.calls.clear()
+    qbot.msg = {}
+    assert recall(qbot, 1) == []
+
+
+def test_recall_deletes_without_anti_recall(qbot, tools, monkeypatch):
+    monkeypatch.setattr(tools.conf, "anti_recall", False)
+    qbot.db.set((55, -100), 1)
+    qbot.db.save(1, [{"type": "text", "data": {"text": "hi"}}], {"text": "hi"})
+    assert recall(qbot, 1) == [
+        ("delete_message", {"chat_id": -100, "message_id": 55})
+    ]
@@ -0,0 +1,76 @@
+import asyncio
+
+from utils.record import Recorder, read_records
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 9,
+        "from": {
+            "id": 111,
+            "username": "alice",
+            "first_name": "Alice",
+            "last_name": "Liddell",
+        },
+        "chat": {"id": -100123, "username": "group", "title": "Wonderland"},
+        "forward_from_chat": {"id": -100555},
+        "via_bot": {"id": 222, "username": "somebot"},
+        "new_chat_members": [{"id": 333, "username": "bob"}],
+        "left_chat_member": {"id": 444},
+    },
+}
+
+
+def values(data) -> set:
+    if isinstance(data, dict):
+        return set().union(*map(values, data.values()))
+    if isinstance(data, list):
+        return set().union(*map(values, data))
+    return {data}
+
+
+def test_scrub_tg():
+    recorder = Recorder(keep={-100123}, salt="salt")
+    scrubbed = recorder.scrub(UPDATE)
+    secrets = {111, 222, 333, 444, -100555, "alice", "bob", "somebot", "group"}
+    secrets |= {"Alice", "Liddell", "Wonderland"}
+    assert not values(scrubbed) & secrets
+    message = scrubbed["message"]
+    assert message["chat"]["id"] == -100123
+    assert message["message_id"] == 9
+    assert message["forward_from_chat"]["id"] < 0
+    assert recorder.scrub(UPDATE) == scrubbed
+
+
+def test_scrub_qq():
+    recorder = Recorder(keep={123}, salt="salt")
+    frame = {
+        "group_id": 123,
+        "user_id": 555,
+        "raw_message": "[CQ:at,qq=777] hi [CQ:at,qq=all]",
+        "message": [{"type": "at", "data": {"qq": "777"}}],
+        "sender": {"user_id": 555, "nickname": "Bob", "card": ""},
+    }
+    result = recorder.scrub(frame)
+    assert result["group_id"] == 123
+    assert result["sender"]["nickname"] not in {"Bob", ""}
+    assert result["sender"]["card"] == ""
+    assert result["user_id"] != 555
+    fake = result["message"][0]["data"]["qq"]
+    assert fake != "777" and fake.isdigit()
+    assert result["raw_message"] == f"[CQ:at,qq={fake}] hi [CQ:at,qq=all]"
+
+
+def test_flush_loop(tmp_path):
+    path = str(tmp_path / "capture.jsonl.gz")
+    recorder = Recorder(path)
+
+    async def run():
+        task = asyncio.create_task(recorder.flush_loop(0.01))
+        recorder.write("qq", {"post_type": "meta_event"})
+        await asyncio.sleep(0.05)
+        assert [r["data"] for r in read_records(path)] == [{"post_type": "meta_event"}]
+        recorder.close()
+        await task
+
+    asyncio.run(run())
@@ -0,0 +1,104 @@
+import re
+
+import pytest
+from telegram import MessageEntity
+
+from utils.render import IMAGE_TEXT, MAX_LENGTH, Renderer, split_text, utf16_len
+
+
+def old_escaped_md(text: str = "", extra: bool = False) -> str:
+    """重构前 tools.escaped_md 的实现，作为对照"""
+    escape_chars = r"\_*[]()~`>#+-=|{}.!"
+    new_text = re.sub(f"([{re.escape(escape_chars)}])", r"\\\1", text)
+    return new_text.strip().replace(".", "·") if extra is True else new_text
+
+
+NAMES = ["Ayatale", " a.b_c* ", "[bot](https://t.me)", "😀~`>#+-=|{}.!", "中文名"]
+TEXTS = ["hello", "1. a_b *c* [d](e) ~f~ `g` >h #i +j -k =l |m {n} .o !p", "😀\n中文"]
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_image_golden(name):
+    url = "https://gchat.qpic.cn/gchatpic_new/0/0-0-ABC/0?term=2"
+    assert Renderer(name).image(url) == {
+        "text": f"*{old_escaped_md(name, extra=True)}*: [⁣⁣⁣图片]({url})",
+        "parse_mode": "MarkdownV2",
+    }
+
+
+@pytest.mark.parametrize("name", NAMES)
+@pytest.mark.parametrize("text", TEXTS)
+def test_text_golden(name, text):
+    assert Renderer(name).text(text) == [
+        {
+            "text": f"*{old_escaped_md(name, extra=True)}*:\n{old_escaped_md(text)}",
+            "parse_mode": "MarkdownV2",
+        }
+    ]
+
+
+def test_split_utf16():
+    text = "a" * 3000 + "\n" + "😀" * 3000
+    chunks = split_text(text)
+    assert "".join(chunks) == text
+    assert all(utf16_len(c) <= MAX_LENGTH for c in chunks)
+    assert chunks == ["a" * 3000 + "\n", "😀" * 2048, "😀" * 952]
+
+
+def test_split_astral_boundary():
+    chunks = split_text("a" + "😀" * 10, 4)
+    assert chunks == ["a😀", "😀😀", "😀😀", "😀😀", "😀😀", "😀"]
+
+
+@pytest.mark.parametrize("entities", [False, True])
+def test_text_split_limit(entities):
+    name, text = "😀" * 10, "😀" * 5000
+    rendered = Renderer(name, entities).text(text)
+    assert len(rendered) == 3
+    for r in rendered:
+        plain = r["text"]
+        if not entities:
+            plain = re.sub(r"\\(.)", r"\1", plain).replace("*", "")
+        assert utf16_len(plain) <= MAX_LENGTH
+
+
+def test_entities_astral_offsets():
+    renderer = Renderer("😀a.b", entities=True)
+    image = renderer.image("https://example.com/1.jpg")
+    assert image["text"] == f"😀a·b: {IMAGE_TEXT}"
+    bold, link = image["entities"]
+    assert (bold.type, bold.offset, bold.length) == (MessageEntity.BOLD, 0, 5)
+    assert (link.type, link.offset, link.length) == (MessageEntity.TEXT_LINK, 7, 5)
+    assert link.url == "https://example.com/1.jpg"
+    (text,) = renderer.text("hi")
+    assert text["text"] == "😀a·b:\nhi"
+    assert text["entities"] == [MessageEntity(MessageEntity.BOLD, 0, 5)]
+
+
+def test_strike():
+    assert Renderer.strike({"text": "*a*", "parse_mode": "MarkdownV2"}) == {
+        "text": "~*a*~",
+        "parse_mode": "MarkdownV2",
+    }
+    rendered = Renderer("😀", entities=True).text("b")[0]
+    strike, bold = Renderer.strike(rendered)["entities"]
+    assert (strike.type, strike.offset, strike.length) == ("strikethrough", 0, 5)
+    assert bold == rendered["entities"][0]
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_file_golden(name):
+    url = "https://example.com/a.txt"
+    size = old_escaped_md(f"{1234567/1048576:.2f}")
+    assert Renderer("").file(name, 1234567, url) == {
+        "text": f"大小: {size}MB\n文件: [{old_escaped_md(name)}]({url})",
+        "parse_mode": "MarkdownV2",
+    }
+
+
+def test_file_entities():
+    rendered = Renderer("", entities=True).file("😀.txt", 1048576, "https://e.com/a")
+    assert rendered["text"] == "大小: 1.00MB\n文件: 😀.txt"
+    (link,) = rendered["entities"]
+    assert (link.type, link.offset, link.length) == (MessageEntity.TEXT_LINK, 15, 6)
+    assert Renderer("", entities=True).file("a", 1, None)["entities"] == []
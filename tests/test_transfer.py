@@ -0,0 +1,124 @@
+import asyncio
+import os
+
+from utils.models import FileTransfer
+from utils.transfer import Transfers
+
+
+async def fake_download(self, job, url: str, path: str):
+    with open(path, "wb") as f:
+        f.write(b"data")
+    job.done = job.size
+
+
+def test_failed_upload_keeps_job(monkeypatch, tmp_path):
+    monkeypatch.setattr(Transfers, "download", fake_download)
+    transfers = Transfers(FileTransfer(spool=str(tmp_path)))
+
+    async def upload(path: str):
+        raise RuntimeError("upload_group_file failed")
+
+    async def run():
+        job = transfers.start("a.txt", 4, "http://example.com/a.txt", upload)
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == "failed"
+    assert transfers[job.id] is job
+    assert not os.listdir(tmp_path)
+    assert transfers.cancel(job.id) and not transfers
+
+
+def test_cancel_waits_for_upload(monkeypatch, tmp_path):
+    monkeypatch.setattr(Transfers, "download", fake_download)
+    transfers = Transfers(FileTransfer(spool=str(tmp_path)))
+    seen = []
+
+    async def upload(path: str):
+        await asyncio.sleep(0.05)
+        seen.append(os.path.exists(path))
+
+    async def run():
+        job = transfers.start("a.txt", 4, "http://example.com/a.txt", upload)
+        while job.state != "uploading":
+            await asyncio.sleep(0)
+        assert transfers.cancel(job.id)
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == "cancelled"
+    assert seen == [True]
+    assert not os.listdir(tmp_path) and not transfers
+
+
+def test_hung_upload_times_out(monkeypatch, tmp_path):
+    monkeypatch.setattr(Transfers, "download", fake_download)
+    monkeypatch.setattr(Transfers, "deadline", lambda self, size: 0.05)
+    transfers = Transfers(FileTransfer(spool=str(tmp_path)))
+
+    async def upload(path: str):
+        await asyncio.sleep(60)
+
+    async def run():
+        job = transfers.start("a.txt", 4, "http://example.com/a.txt", upload)
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == "failed"
+    assert not os.listdir(tmp_path)
+
+
+def test_cancel_gives_up_hung_upload(monkeypatch, tmp_path):
+    monkeypatch.setattr(Transfers, "download", fake_download)
+    monkeypatch.setattr("utils.transfer.CANCEL_WAIT", 0.05)
+    transfers = Transfers(FileTransfer(spool=str(tmp_path)))
+
+    async def upload(path: str):
+        await asyncio.sleep(60)
+
+    async def run():
+        job = transfers.start("a.txt", 4, "http://example.com/a.txt", upload)
+        while job.state != "uploading":
+            await asyncio.sleep(0)
+        assert transfers.cancel(job.id)
+        await asyncio.wait_for(job.task, 1)
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == "cancelled"
+    assert not os.listdir(tmp_path) and not transfers
+
+
+def test_deadline():
+    transfers = Transfers(FileTransfer(min_rate=32))
+    assert transfers.deadline(1024) == 60
+    assert transfers.deadline(20 * 1048576) == 640
+
+
+def test_tg_upload_breaker(tools, monkeypatch, tmp_path):
+    from utils import qq
+
+    monkeypatch.setattr(Transfers, "download", fake_download)
+    monkeypatch.setattr(qq, "transfers", Transfers(FileTransfer(spool=str(tmp_path))))
+    monkeypatch.setattr(tools.conf.circuit, "min_calls", 1)
+    breakers = tools.Breakers(tools.conf.circuit)
+    monkeypatch.setattr(qq, "breakers", breakers)
+
+    class Bot:
+        async def send_document(self, **kwargs):
+            raise TimeoutError
+
+    async def run():
+        bot = qq.Qbot(tools.conf.qq_ws, tools.conf.qq_http)
+        bot.tg = Bot()
+        bot.send_file_to_tg(-100, "a.txt", 4, "http://example.com/a.txt", None)
+        [job] = qq.transfers.values()
+        await job.task
+        return job
+
+    assert asyncio.run(run()).state == "failed"
+    assert breakers["tg/upload"].state == "open"
+    assert "tg" not in breakers and breakers.allow("tg/send_message", "tg")
@@ -1,4 +1,4 @@
 from .models import Config
 from .qq import Qbot
 from .tg import Tbot
-from .tools import base_dir, conf, logger
+from .tools import base_dir, breakers, conf, logger, recorder, transfers
@@ -0,0 +1,171 @@
+import asyncio
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from time import perf_counter, time
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from .models import Circuit
+
+
+class Breaker:
+    """熔断器，失败率或慢调用比例过高时熔断，经过 reset_timeout 后放行一次探测请求"""
+
+    def __init__(self, name: str, c: Circuit):
+        self.name, self.c = name, c
+        self.state = "closed"
+        self.calls: deque[bool] = deque(maxlen=c.window)
+        self.opened_at = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.state} ({self.calls.count(False)}/{len(self.calls)})"
+
+    def allow(self) -> bool:
+        """判断是否放行请求，熔断超时后转为半开状态并放行一次探测"""
+        if self.state == "closed":
+            return True
+        if time() - self.opened_at < self.c.reset_timeout:
+            return False
+        self.state, self.opened_at = "half_open", time()
+        return True
+
+    def record(self, ok: bool, elapsed: float):
+        """记录一次调用结果，超过 slow_call 秒的调用视为失败"""
+        ok = ok and elapsed < self.c.slow_call
+        if self.state == "half_open" and ok:
+            self.close()
+        elif self.state == "half_open":
+            self.trip()
+        elif self.state == "closed":
+            self.calls.append(ok)
+            failures = self.calls.count(False)
+            if len(self.calls) >= self.c.min_calls and (
+                failures / len(self.calls) >= self.c.failure_rate
+            ):
+                self.trip()
+
+    def trip(self):
+        if self.state != "open":
+            logger.warning("Circuit '{}' opened", self.name)
+        self.state, self.opened_at = "open", time()
+
+    def close(self):
+        logger.success("Circuit '{}' closed", self.name)
+        self.state = "closed"
+        self.calls.clear()
+
+    @contextmanager
+    def track(self, *ignore: type[Exception], slow: bool = True):
+        """记录代码块的耗时与结果
+
+        Args:
+            ignore (type[Exception]): 视为上游正常响应的异常
+            slow (bool, optional): 是否统计慢调用，上传文件等耗时操作应设为 False
+        """
+        start, ok = perf_counter(), None
+        try:
+            yield
+            ok = True
+        except ignore:
+            ok = True
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            if ok is not None:
+                self.record(ok, perf_counter() - start if slow else 0)
+
+
+class Breakers(dict[str, Breaker]):
+    """按名称自动创建的熔断器集合，名称形如 qq 或 qq/get_msg"""
+
+    def __init__(self, c: Circuit):
+        self.c = c
+
+    def __missing__(self, name: str) -> Breaker:
+        self[name] = Breaker(name, self.c)
+        return self[name]
+
+    def __str__(self) -> str:
+        return "\n".join(str(b) for b in self.values()) or "No circuit"
+
+    def allow(self, *names: str) -> bool:
+        """依次判断各熔断器，任一拒绝时不再询问之后的熔断器"""
+        return all(self[name].allow() for name in names)
+
+    @contextmanager
+    def track(
+        self,
+        *names: str,
+        ignore: tuple[type[Exception], ...] = (),
+        slow: bool = True,
+    ):
+        with ExitStack() as stack:
+            for name in names:
+                stack.enter_context(self[name].track(*ignore, slow=slow))
+            yield
+
+
+class Outbox:
+    """熔断期间暂存待发送的请求，按熔断器的探测节奏依次发送"""
+
+    def __init__(
+        self,
+        breakers: Breakers,
+        names: tuple[str, ...],
+        send: Callable[[dict], Awaitable],
+        terminal: tuple[type[Exception], ...] = (),
+    ):
+        """
+        Args:
+            breakers (Breakers): 熔断器集合
+            names (tuple[str, ...]): 发送前需要放行的熔断器名称
+            send (Callable[[dict], Awaitable]): 实际发送请求的函数，参数为请求参数
+            terminal (tuple[type[Exception], ...], optional): 不再重试的异常
+        """
+        self.breakers, self.names = breakers, names
+        self.send, self.terminal = send, terminal
+        self.queue: asyncio.Queue = asyncio.Queue(breakers.c.queue_size)
+        self.task: asyncio.Task | None = None
+        # 已入队但尚未发送完成的请求数，不为 0 时新请求也应入队以保持顺序
+        self.pending = 0
+
+    async def put(self, kwargs: dict):
+        """加入队列并等待发送结果，队列已满或最终发送失败时返回 None"""
+        if self.queue.full():
+            logger.warning("Circuit '{}' queue is full, drop: {}", self.names[0], kwargs)
+            return
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.drain())
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((kwargs, future))
+        self.pending += 1
+        logger.warning("Circuit '{}' queued: {}", self.names[0], self.queue.qsize())
+        return await future
+
+    async def drain(self):
+        while True:
+            kwargs, future = await self.queue.get()
+            result = None
+            for retry in range(1, self.breakers.c.retries + 1):
+                while not future.done() and not self.breakers.allow(*self.names):
+                    await asyncio.sleep(1)
+                if future.done():
+                    break
+                try:
+                    result = await self.send(kwargs)
+                    break
+                except self.terminal as e:
+                    logger.error("Circuit '{}' rejected: {}", self.names[0], repr(e))
+                    break
+                except Exception as e:
+                    logger.error(
+                        "Circuit '{}' retry {}: {}", self.names[0], retry, repr(e)
+                    )
+            else:
+                logger.error("Circuit '{}' gave up: {}", self.names[0], kwargs)
+            self.pending -= 1
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,56 @@
+import sys
+from time import monotonic
+from typing import TextIO
+
+from loguru import logger
+
+
+def add_sinks(
+    fmt: str,
+    level: str,
+    file: str = "",
+    file_level: str = "INFO",
+    rotation: str = "20 MB",
+    stream: TextIO = sys.stderr,
+):
+    """配置日志，终端输出彩色文本，文件以 json 格式在后台线程中批量写入并按大小轮转
+
+    Args:
+        fmt (str): 终端日志格式
+        level (str): 终端日志等级
+        file (str, optional): 日志文件路径，为空时不写入文件
+        file_level (str, optional): 日志文件等级，默认为 INFO
+        rotation (str, optional): 日志文件轮转大小，默认为 20 MB
+        stream (TextIO, optional): 终端输出流，默认为 stderr
+    """
+    logger.remove()
+    logger.add(stream, colorize=True, format=fmt, level=level)
+    if file:
+        logger.add(
+            file,
+            level=file_level,
+            rotation=rotation,
+            serialize=True,
+            enqueue=True,
+            buffering=65536,
+        )
+
+
+class Sampler:
+    """按 chat id 限制高频日志，每秒最多 rate 条，超出后每 sample 条记录一条"""
+
+    def __init__(self, rate: float, sample: int):
+        self.rate, self.sample = rate, sample
+        self.buckets: dict[int | None, tuple[float, float, int]] = {}
+
+    def __call__(self, key: int | None) -> bool:
+        if self.rate <= 0:
+            return True
+        now = monotonic()
+        tokens, last, skipped = self.buckets.get(key, (self.rate, now, 0))
+        tokens = min(self.rate, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now, 0)
+            return True
+        self.buckets[key] = (tokens, now, skipped + 1)
+        return self.sample > 0 and (skipped + 1) % self.sample == 0
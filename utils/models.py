@@ -7,15 +7,43 @@ class Forward(BaseModel):
     g: dict[int, int]
 
 
+class Circuit(BaseModel):
+    window: int = 20
+    min_calls: int = 5
+    failure_rate: float = 0.5
+    slow_call: float = 5
+    reset_timeout: float = 30
+    queue_size: int = 100
+    retries: int = 10
+
+
+class FileTransfer(BaseModel):
+    max_size: int = 20
+    concurrency: int = 2
+    bandwidth: int = 0
+    chunk_size: int = 64
+    min_rate: int = 32
+    spool: str = ""
+
+
 class Config(BaseModel):
     log_level: str
     log_format: str
+    log_file_level: str = "INFO"
+    log_rotation: str = "20 MB"
+    log_rate: float = 5
+    log_sample: int = 10
     qq_ws: str
     qq_http: str
     tg_api: str
     tg_token: str
     forward: Forward
     anti_recall: bool = False
+    snapshot_size: int = 1000
+    tg_entities: bool = False
+    record_file: str = ""
+    circuit: Circuit = Circuit()
+    transfer: FileTransfer = FileTransfer()
 
 
 class Message(BaseModel):
@@ -24,9 +52,11 @@ class Message(BaseModel):
 
 
 class File(BaseModel):
+    id: str | None
+    busid: int | None
     name: str
     size: int
-    url: str
+    url: str | None
 
 
 class Sender(BaseModel):
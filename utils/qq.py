@@ -7,8 +7,25 @@ from telegram import Bot
 from websockets.exceptions import ConnectionClosedError
 from websockets.legacy.client import connect
 
+from .breaker import Outbox
 from .models import DataModel
-from .tools import conf, db, escaped_md, facemap, logger
+from .render import Renderer
+from .tools import (
+    TG_TERMINAL,
+    breakers,
+    call_tg,
+    conf,
+    db,
+    facemap,
+    logger,
+    recorder,
+    sampler,
+    transfers,
+)
+
+
+TG_SEND = ("tg/send_message", "tg")
+QQ_SEND = ("qq/send_msg", "qq")
 
 
 class Qbot:
@@ -20,6 +37,10 @@ class Qbot:
             qq_http (str): gocqhttp 的正向 http 地址，形如http://ip:port
         """
         self.ws, self.http = qq_ws, qq_http
+        self.tg_outbox = Outbox(breakers, TG_SEND, self.post_to_tg, TG_TERMINAL)
+        self.qq_outbox = Outbox(
+            breakers, QQ_SEND, partial(self.post_to_qq, "send_msg")
+        )
 
     def __getattr__(self, name: str):
         """魔术方法，调用任意api"""
@@ -35,13 +56,53 @@ class Qbot:
         Returns:
             dict: api返回值
         """
+        if not breakers.allow(f"qq/{method}", "qq"):
+            logger.debug("Circuit open, skip {}", method)
+            return {}
+        return await self.post_to_qq(method, kwargs)
+
+    async def post_to_qq(self, method: str, kwargs: dict) -> dict:
+        """不经熔断器判断，直接请求 gocqhttp，结果计入 qq 与 qq/<method> 熔断器"""
         async with AsyncClient(base_url=self.http, timeout=10) as client:
-            result = (await client.post(method, json=kwargs)).json()
+            with breakers.track(f"qq/{method}", "qq"):
+                result = (await client.post(method, json=kwargs)).json()
             if result.get("retcode") == 0:
                 return result
             logger.error(result)
             return {}
 
+    async def upload_to_qq(self, method: str, timeout: float, **kwargs) -> dict:
+        """上传群文件或私聊文件，gocqhttp 上传完成后才会响应
+
+        使用按文件大小限时的独立请求，只计入 qq/upload 熔断器且不统计慢调用，
+        避免大文件拖垮 qq 熔断器而阻断文字转发
+
+        Args:
+            method (str): upload_group_file 或 upload_private_file
+            timeout (float): 请求超时时间，通常为 transfers.deadline(size)
+
+        Raises:
+            RuntimeError: 熔断中或 gocqhttp 返回失败
+
+        Returns:
+            dict: api返回值
+        """
+        if not breakers.allow("qq/upload"):
+            raise RuntimeError("Circuit 'qq/upload' is open")
+        async with AsyncClient(base_url=self.http, timeout=timeout) as client:
+            with breakers.track("qq/upload", slow=False):
+                result = (await client.post(method, json=kwargs)).json()
+        if result.get("retcode") != 0:
+            raise RuntimeError(f"{method} failed: {result}")
+        return result
+
+    @logger.catch
+    async def send_to_qq(self, **kwargs) -> dict:
+        """发送 qq 消息，熔断期间或队列中仍有消息时加入队列，等待恢复后按序发送"""
+        if self.qq_outbox.pending or not breakers.allow(*QQ_SEND):
+            return await self.qq_outbox.put(kwargs) or {}
+        return await self.post_to_qq("send_msg", kwargs)
+
     @logger.catch
     async def on_message(self, message: str | bytes):
         """处理接受的消息
@@ -54,14 +115,27 @@ class Qbot:
             logger.debug("Sent: {}", d.raw_message)
             db.sent = False
         elif d.message_type == "group" and (d.group_id in conf.forward.g):
-            logger.info(f"<- Group {d.group_id}-{d.user_id}: {d.raw_message}")
+            if sampler(d.group_id):
+                logger.info(
+                    "<- Group {group}-{user}: {msg}",
+                    group=d.group_id,
+                    user=d.user_id,
+                    msg=d.raw_message,
+                )
             await self.forward_to_tg(conf.forward.g[d.group_id], d)
         elif d.message_type == "private" and (d.user_id in conf.forward.u):
-            logger.info(f"<- User {d.user_id}: {d.raw_message}")
+            if sampler(d.user_id):
+                logger.info("<- User {user}: {msg}", user=d.user_id, msg=d.raw_message)
             await self.forward_to_tg(conf.forward.u[d.user_id], d)
         elif "recall" in d.notice_type and d.message_id in db.qq:  # type:ignore
-            if not conf.anti_recall:
+            # bot 自己发送的消息由 telegram 转发而来，快照丢失来源时也能跳过
+            if d.user_id != d.self_id:
                 await self.recall_msg(d.message_id)
+        elif d.notice_type == "group_upload" and (d.group_id in conf.forward.g):
+            if d.user_id != d.self_id:
+                await self.forward_to_tg(conf.forward.g[d.group_id], d)
+        elif d.notice_type == "offline_file" and (d.user_id in conf.forward.u):
+            await self.forward_to_tg(conf.forward.u[d.user_id], d)
 
     @logger.catch
     async def ws_client(self):
@@ -70,6 +144,8 @@ class Qbot:
             if "meta_event_type" in json.loads(await ws.recv()):
                 logger.success("Successful connection to '{}'", self.ws)
             async for message in ws:
+                if recorder.enabled:
+                    recorder.write("qq", json.loads(message))
                 asyncio.create_task(self.on_message(message))
 
     @logger.catch
@@ -92,37 +168,69 @@ class Qbot:
             chat_id (int): 消息所在群/用户对应的 telegram 群的 chai_id
             d (DataModel): 传入的消息模型
         """
-        msg_id_tg = None
+        msg_id_tg, rendered = None, {}
         if d.message and d.sender:
-            user_name = escaped_md(d.sender.card or d.sender.nickname, extra=True)
+            renderer = Renderer(d.sender.card or d.sender.nickname, conf.tg_entities)
             reply_id, text, img_list = await self.create_msg(d)
-            if img_list:
-                for img in img_list:
+            for img in img_list:
+                rendered = renderer.image(img)
+                msg_id_tg = await self.send_to_tg(chat_id=chat_id, **rendered)
+            if text:
+                for rendered in renderer.text(text):
                     msg_id_tg = await self.send_to_tg(
-                        chat_id=chat_id,
-                        text=f"*{user_name}*: [⁣⁣⁣图片]({img})",
-                        parse_mode="MarkdownV2",
+                        chat_id=chat_id, reply_to_message_id=reply_id, **rendered
                     )
-            if text:
-                msg_id_tg = await self.send_to_tg(
-                    chat_id=chat_id,
-                    reply_to_message_id=reply_id,
-                    text=f"*{user_name}*:\n{escaped_md(text)}",
-                    parse_mode="MarkdownV2",
-                )
+                    reply_id = None
         elif d.file:
-            size = escaped_md(f"{d.file.size/1048576:.2f}")
-            file_name = escaped_md(d.file.name)
-            text = f"大小: {size}MB\n文件: [{(file_name)}]({d.file.url})"
-            msg_id_tg = await self.send_to_tg(
-                chat_id=chat_id,
-                text=text,
-                parse_mode="MarkdownV2",
-            )
+            if not d.file.url:
+                d.file.url = (
+                    await self.get_group_file_url(
+                        group_id=d.group_id, file_id=d.file.id, busid=d.file.busid
+                    )
+                    or {}
+                ).get("data", {}).get("url")
+            renderer = Renderer("", conf.tg_entities)
+            rendered = renderer.file(d.file.name, d.file.size, d.file.url)
+            msg_id_tg = await self.send_to_tg(chat_id=chat_id, **rendered)
+            if d.file.url and transfers.allowed(d.file.size):
+                self.send_file_to_tg(
+                    chat_id, d.file.name, d.file.size, d.file.url, msg_id_tg
+                )
         else:
             return
         if msg_id_tg and d.message_id:
             db.set((msg_id_tg, chat_id), d.message_id)
+            db.save(d.message_id, [m.dict() for m in d.message or []], rendered)
+
+    def send_file_to_tg(
+        self, chat_id: int, name: str, size: int, url: str, reply_id: int | None
+    ):
+        """在后台下载 qq 文件并作为 document 发送到 telegram
+
+        Args:
+            chat_id (int): telegram 群的 chat_id
+            name (str): 文件名
+            size (int): 文件大小
+            url (str): qq 文件的下载地址
+            reply_id (int | None): 要回复的 telegram 消息 id，通常为文件链接消息
+        """
+
+        async def upload(path: str):
+            # 只计入 tg/upload 熔断器，避免大文件拖垮 tg 熔断器而阻断文字转发
+            if not breakers.allow("tg/upload"):
+                raise RuntimeError("Circuit 'tg/upload' is open")
+            with open(path, "rb") as f:
+                with breakers.track("tg/upload", ignore=TG_TERMINAL, slow=False):
+                    await self.tg.send_document(
+                        chat_id=chat_id,
+                        document=f,
+                        filename=name,
+                        reply_to_message_id=reply_id,
+                        read_timeout=120,
+                        write_timeout=120,
+                    )
+
+        transfers.start(name, size, url, upload)
 
     @logger.catch
     async def create_msg(self, d: DataModel) -> tuple:
@@ -134,7 +242,7 @@ class Qbot:
         Returns:
             tuple: _description_
         """
-        reply_id, text, img_list = None, "", []
+        reply_id, parts, img_list = None, [], []
         for msg in d.message:  # type:ignore
             match msg.type:
                 case "at":
@@ -146,40 +254,116 @@ class Qbot:
                             await self.get_group_member_info(
                                 group_id=d.group_id, user_id=at
                             )
+                            or {}
                         ).get("data", {})
-                        at_name = at_info.get("card") or at_info.get("nickname")
-                    text = f"{text}@{at_name} "
+                        at_name = at_info.get("card") or at_info.get("nickname") or at
+                    parts.append(f"@{at_name} ")
                 case "text":
-                    text = f'{text}{msg.data["text"]} '
+                    parts.append(f'{msg.data["text"]} ')
                 case "face":
-                    text = f'{text}{facemap[msg.data["id"]]} '
+                    parts.append(f'{facemap[msg.data["id"]]} ')
                 case "image":
                     img_list.append(msg.data["url"])
                 case "reply":
                     reply_id = db.get_tg_msgid(msg.data["id"])[0]
                 case "video":
-                    text = "[暂不支持视频消息]"
+                    parts = ["[暂不支持视频消息]"]
                 case "forward":
-                    text = "[暂不支持合并转发消息]"
+                    parts = ["[暂不支持合并转发消息]"]
                 case "record":
-                    text = "[暂不支持语音消息]"
+                    parts = ["[暂不支持语音消息]"]
                 case _:
-                    logger.warning(f"[不支持的消息]: {msg.type}")
-        return reply_id, text, img_list
+                    logger.warning("[不支持的消息]: {}", msg.type)
+        return reply_id, "".join(parts), img_list
+
+    async def post_to_tg(self, kwargs: dict) -> int:
+        with breakers.track(*TG_SEND, ignore=TG_TERMINAL):
+            return (await self.tg.send_message(**kwargs)).message_id
 
     @logger.catch
     async def send_to_tg(self, **kwargs):
         for _ in range(3):
+            if self.tg_outbox.pending or not breakers.allow(*TG_SEND):
+                return await self.tg_outbox.put(kwargs)
             try:
-                return (await self.tg.send_message(**kwargs)).message_id
+                return await self.post_to_tg(kwargs)
+            except TG_TERMINAL as e:
+                logger.error(repr(e))
+                return
             except Exception as e:
                 logger.error("Retrying {} times... {}", _ + 1, repr(e))
                 await asyncio.sleep(2)
 
     @logger.catch
-    async def recall_msg(self, qq_msgid):
-        msg_list = (await self.get_msg(message_id=qq_msgid))["data"]["message"]
-        raw_message = " ".join([m["data"].get("text", "") for m in msg_list])
-        logger.info(f"<- Delete msg {qq_msgid}: {raw_message}")
+    async def get_segments(self, qq_msgid: int) -> list[dict]:
+        """获取消息段列表，优先查询本地快照，查询不到时再调用 get_msg
+
+        Args:
+            qq_msgid (int): qq 的消息 id
+
+        Returns:
+            list[dict]: onebot11 标准的消息段列表
+        """
+        if segments := db.load(qq_msgid)[0]:
+            return segments
+        result = await self.get_msg(message_id=qq_msgid) or {}
+        return result.get("data", {}).get("message", [])
+
+    @staticmethod
+    def render_recalled(sender: dict, segments: list[dict]) -> dict:
+        """消息不在快照中时，按 get_msg 的结果重新渲染转发时的最后一条消息
+
+        Args:
+            sender (dict): get_msg 返回的发送者信息
+            segments (list[dict]): onebot11 标准的消息段列表
+
+        Returns:
+            dict: send_message 的参数，无法重建时为空
+        """
+        renderer = Renderer(
+            sender.get("card") or sender.get("nickname") or "anonymous",
+            conf.tg_entities,
+        )
+        if text := "".join(s["data"].get("text", "") for s in segments).strip():
+            return renderer.text(text)[-1]
+        if images := [s["data"]["url"] for s in segments if s["type"] == "image"]:
+            return renderer.image(images[-1])
+        return {}
+
+    @logger.catch
+    async def recall_msg(self, qq_msgid: int):
+        """同步 qq 的撤回，开启防撤回时为 bot 转发的消息加上删除线，否则删除
+
+        Args:
+            qq_msgid (int): 被撤回的 qq 消息 id
+        """
         tg_msgid, chat_id = db.qq[qq_msgid]
-        await self.tg.delete_message(chat_id=chat_id, message_id=tg_msgid)
+        segments, rendered, origin = db.load(qq_msgid)
+        if origin == "tg":
+            # 该消息由 telegram 转发而来，telegram 中的是用户的原消息
+            logger.debug("Recalled msg {} is from telegram, skip", qq_msgid)
+            return
+        data = {}
+        if not segments:
+            data = (await self.get_msg(message_id=qq_msgid) or {}).get("data", {})
+            segments = data.get("message", [])
+        raw_message = " ".join([m["data"].get("text", "") for m in segments])
+        logger.info("<- Delete msg {id}: {msg}", id=qq_msgid, msg=raw_message)
+        if not conf.anti_recall:
+            await call_tg(
+                self.tg, "delete_message", chat_id=chat_id, message_id=tg_msgid
+            )
+            return
+        if not rendered:
+            logger.warning("Recalled msg {} not in snapshot", qq_msgid)
+            rendered = self.render_recalled(data.get("sender", {}), segments)
+        if not rendered:
+            logger.warning("Failed to rebuild recalled msg {}, keep it", qq_msgid)
+            return
+        await call_tg(
+            self.tg,
+            "edit_message_text",
+            chat_id=chat_id,
+            message_id=tg_msgid,
+            **Renderer.strike(rendered),
+        )
@@ -0,0 +1,115 @@
+import asyncio
+import gzip
+import json
+import re
+from hashlib import blake2b
+from time import time
+from typing import Iterator
+
+QQ_ID_KEYS = {"user_id", "self_id", "group_id", "operator_id", "target_id", "qq"}
+TG_ID_PARENTS = {
+    "from",
+    "chat",
+    "user",
+    "sender_chat",
+    "forward_from",
+    "forward_from_chat",
+    "new_chat_members",
+    "new_chat_member",
+    "old_chat_member",
+    "left_chat_member",
+    "via_bot",
+    "user_shared",
+    "chat_shared",
+}
+# 用户名、昵称、群名片与 chat 标题等可识别身份的名称
+NAME_KEYS = {"username", "nickname", "card", "first_name", "last_name", "title"}
+CQ_AT = re.compile(r"(\[CQ:at,qq=)(\d+)")
+
+
+class Recorder:
+    """将 gocqhttp 的 ws 数据与 telegram 的 Update 以 gzip 压缩的 jsonl 格式录制"""
+
+    def __init__(self, path: str = "", keep: set[int] | None = None, salt: str = ""):
+        """初始化录制参数
+
+        Args:
+            path (str, optional): 录制文件路径，为空时不录制
+            keep (set[int], optional): 不做假名化处理的 id，通常为转发配置中的群号与 chat_id
+            salt (str, optional): 生成假名 id 时使用的密钥
+        """
+        self.file = gzip.open(path, "at", encoding="utf-8") if path else None
+        self.keep, self.key = keep or set(), salt.encode()[:64]
+
+    def pseudo(self, value):
+        """将 id 替换为稳定的假名 id，保持正负号与转发配置中的 id 不变"""
+        if isinstance(value, str) and value.isdigit():
+            return str(self.pseudo(int(value)))
+        if not isinstance(value, int) or isinstance(value, bool) or value in self.keep:
+            return value
+        digest = blake2b(str(abs(value)).encode(), key=self.key, digest_size=8)
+        fake = int.from_bytes(digest.digest(), "big") % 10**10
+        return -fake if value < 0 else fake
+
+    def pseudo_name(self, value):
+        """将名称替换为稳定的假名，空名称保持不变"""
+        if not isinstance(value, str) or not value:
+            return value
+        digest = blake2b(value.lower().encode(), key=self.key, digest_size=5)
+        return f"user_{digest.hexdigest()}"
+
+    def scrub(self, data, parent: str = ""):
+        """递归地对数据中的用户、群、chat 的 id 与名称做假名化处理"""
+        if isinstance(data, list):
+            return [self.scrub(i, parent) for i in data]
+        if not isinstance(data, dict):
+            return data
+        result = {}
+        for k, v in data.items():
+            if k in QQ_ID_KEYS or (k == "id" and parent in TG_ID_PARENTS):
+                result[k] = self.pseudo(v)
+            elif k in NAME_KEYS:
+                result[k] = self.pseudo_name(v)
+            elif k == "raw_message" and isinstance(v, str):
+                result[k] = CQ_AT.sub(lambda m: f"{m[1]}{self.pseudo(int(m[2]))}", v)
+            else:
+                result[k] = self.scrub(v, k)
+        return result
+
+    @property
+    def enabled(self) -> bool:
+        return self.file is not None
+
+    def write(self, source: str, data: dict):
+        """写入一条记录
+
+        Args:
+            source (str): 数据来源，"qq" 或 "tg"
+            data (dict): gocqhttp 的 ws 数据或 telegram 的 Update.to_dict()
+        """
+        if self.file is None:
+            return
+        record = {"t": time(), "src": source, "data": self.scrub(data)}
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def flush_loop(self, interval: float = 1):
+        """定时将缓冲区写入文件，避免空闲时最后的记录一直留在内存中"""
+        while self.file is not None:
+            self.file.flush()
+            await asyncio.sleep(interval)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """逐条读取录制文件，允许文件因录制中断而不完整"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+        except EOFError:
+            return
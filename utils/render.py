@@ -0,0 +1,145 @@
+from telegram import MessageEntity
+
+MAX_LENGTH = 4096
+IMAGE_TEXT = "⁣⁣⁣图片"
+MD_TABLE = str.maketrans({c: f"\\{c}" for c in r"\_*[]()~`>#+-=|{}.!"})
+
+
+def utf16_len(text: str) -> int:
+    """telegram 以 utf-16 码元计算长度与实体偏移"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def utf16_cut(text: str, limit: int) -> int:
+    """返回 utf-16 长度不超过 limit 的最长前缀的字符数，至少为 1"""
+    if utf16_len(head := text[: limit + 1]) <= limit:
+        return len(head)
+    width = 0
+    for i, c in enumerate(head):
+        width += 2 if c > "\uffff" else 1
+        if width > limit:
+            return max(i, 1)
+    return len(head)
+
+
+def split_text(text: str, limit: int = MAX_LENGTH) -> list[str]:
+    """将超长文本切分为不超过 limit 的若干段，尽量在换行处切分
+
+    Args:
+        text (str): 未转义的原始文本
+        limit (int, optional): 每段的最大长度，默认为 telegram 的 4096
+
+    Returns:
+        list[str]: 切分后的文本列表
+    """
+    chunks = []
+    while (cut := utf16_cut(text, limit)) < len(text):
+        if (newline := text.rfind("\n", 0, cut)) > cut // 2:
+            cut = newline + 1
+        chunks.append(text[:cut])
+        text = text[cut:]
+    chunks.append(text)
+    return chunks
+
+
+class Renderer:
+    """将消息渲染为 send_message 的参数，可选 MarkdownV2 或 entities 两种输出"""
+
+    def __init__(self, user_name: str, entities: bool = False):
+        """初始化渲染参数
+
+        Args:
+            user_name (str): 未转义的发送者名称
+            entities (bool, optional): 是否使用 entities 代替 MarkdownV2，默认为 False
+        """
+        self.entities = entities
+        if not entities:
+            user_name = user_name.translate(MD_TABLE)
+        self.name = user_name.strip().replace(".", "·")
+
+    def image(self, url: str) -> dict:
+        """渲染一条图片链接消息"""
+        if not self.entities:
+            return {
+                "text": f"*{self.name}*: [{IMAGE_TEXT}]({url})",
+                "parse_mode": "MarkdownV2",
+            }
+        offset = utf16_len(self.name) + 2
+        return {
+            "text": f"{self.name}: {IMAGE_TEXT}",
+            "entities": [
+                MessageEntity(MessageEntity.BOLD, 0, offset - 2),
+                MessageEntity(
+                    MessageEntity.TEXT_LINK, offset, utf16_len(IMAGE_TEXT), url=url
+                ),
+            ],
+        }
+
+    def file(self, name: str, size: int, url: str | None) -> dict:
+        """渲染一条文件链接消息
+
+        Args:
+            name (str): 未转义的文件名
+            size (int): 文件大小
+            url (str | None): 文件的下载地址
+
+        Returns:
+            dict: send_message 的参数
+        """
+        size_text = f"{size / 1048576:.2f}"
+        if not self.entities:
+            return {
+                "text": f"大小: {size_text.translate(MD_TABLE)}MB\n"
+                f"文件: [{name.translate(MD_TABLE)}]({url})",
+                "parse_mode": "MarkdownV2",
+            }
+        text, entities = f"大小: {size_text}MB\n文件: ", []
+        if url:
+            entities.append(
+                MessageEntity(
+                    MessageEntity.TEXT_LINK, utf16_len(text), utf16_len(name), url=url
+                )
+            )
+        return {"text": f"{text}{name}", "entities": entities}
+
+    @staticmethod
+    def strike(rendered: dict) -> dict:
+        """为已渲染的消息整体加上删除线"""
+        if "entities" not in rendered:
+            return {"text": f"~{rendered['text']}~", "parse_mode": "MarkdownV2"}
+        length = utf16_len(rendered["text"])
+        return {
+            "text": rendered["text"],
+            "entities": [
+                MessageEntity(MessageEntity.STRIKETHROUGH, 0, length),
+                *rendered["entities"],
+            ],
+        }
+
+    def text(self, text: str) -> list[dict]:
+        """渲染文本消息，超出长度限制时自动切分为多条
+
+        Args:
+            text (str): 未转义的消息文本
+
+        Returns:
+            list[dict]: send_message 的参数列表
+        """
+        name_len = utf16_len(self.name)
+        result = []
+        for chunk in split_text(text, MAX_LENGTH - name_len - 2):
+            if self.entities:
+                result.append(
+                    {
+                        "text": f"{self.name}:\n{chunk}",
+                        "entities": [MessageEntity(MessageEntity.BOLD, 0, name_len)],
+                    }
+                )
+            else:
+                result.append(
+                    {
+                        "text": f"*{self.name}*:\n{chunk.translate(MD_TABLE)}",
+                        "parse_mode": "MarkdownV2",
+                    }
+                )
+        return result
@@ -6,7 +6,10 @@ from telegram.ext import Updater
 from telegram.error import TelegramError
 
 from .qq import Qbot
-from .tools import Msg, conf, db, logger
+from .tools import Msg, call_tg, conf, db, logger, recorder, sampler, transfers
+
+
+MEDIA_HOLDER = {"image": "[图片]", "video": "[视频]"}
 
 
 class Tbot:
@@ -39,10 +42,12 @@ class Tbot:
                 parse_mode="MarkdownV2",
             )
         elif m.chat_id in conf.forward.g:
-            logger.info("-> Group {}: {}", g := conf.forward.g[m.chat_id], m.text)
+            if sampler(g := conf.forward.g[m.chat_id]):
+                logger.info("-> Group {group}: {msg}", group=g, msg=m.text)
             await self.forward_to_qq(m, group_id=g, edit=edit)
         elif m.chat_id in conf.forward.u:
-            logger.info("-> User {}: {}", u := conf.forward.u[m.chat_id], m.text)
+            if sampler(u := conf.forward.u[m.chat_id]):
+                logger.info("-> User {user}: {msg}", user=u, msg=m.text)
             await self.forward_to_qq(m, user_id=u, edit=edit)
 
     @logger.catch
@@ -57,6 +62,8 @@ class Tbot:
                     logger.success("Successful connection to '{}'", self.base_url)
                     while True:
                         update: Update = await q.get()
+                        if recorder.enabled:
+                            recorder.write("tg", update.to_dict())
                         if m := (update.message or update.edited_message):
                             edit = bool(update.edited_message)
                             asyncio.create_task(self.on_message(bot, m, edit))
@@ -82,16 +89,25 @@ class Tbot:
         """
         if edit and (msg_id_qq := db.get_qq_msgid((m.message_id, m.chat_id))):
             r = await self.qq.delete_msg(message_id=msg_id_qq)
-            logger.info(r if r["retcode"] else f"Delete：{m.message_id}:{msg_id_qq}")
+            if r.get("retcode"):
+                logger.info(r)
+            else:
+                logger.info("Delete：{}:{}", m.message_id, msg_id_qq)
             if m.text.startswith("/rm"):
                 return
         msg_list = await self.create_msg_list(m)
+        if self.is_file(m) and not edit:
+            await self.send_file_to_qq(m, user_id=user_id, group_id=group_id)
         db.sent = True
-        result = await self.qq.send_msg(
+        result = await self.qq.send_to_qq(
             message=msg_list, user_id=user_id, group_id=group_id
         )
-        msg_id_qq: int = result.get("data", {}).get("message_id", 0)
+        msg_id_qq: int = (result or {}).get("data", {}).get("message_id", 0)
+        if not msg_id_qq:
+            logger.warning("Failed to send to qq: {}", m.message_id)
         db.set((m.message_id, m.chat_id), msg_id_qq)
+        if msg_id_qq:
+            db.save(msg_id_qq, msg_list, origin="tg")
 
     @logger.catch
     async def create_msg_list(self, m: Message) -> list[dict]:
@@ -107,7 +123,7 @@ class Tbot:
         if m.reply_to_message:
             reply_id = db.get_qq_msgid((m.reply_to_message.message_id, m.chat_id))
             if m.text == "/1":
-                return (await self.qq.get_msg(message_id=reply_id))["data"]["message"]
+                return await self.qq.get_segments(reply_id)
             msg_list.append(Msg.reply(reply_id))
         if m.text:
             msg_list.append(Msg.text(m.text))
@@ -121,15 +137,76 @@ class Tbot:
             image_url = await self.cache_file_url(m.photo[-1].file_id)
             msg_list.append(Msg.image(image_url))
         elif m.document:
-            if "image/" in m.document.mime_type:
+            if "image/" in (m.document.mime_type or ""):
                 image_url = await self.cache_file_url(m.document.file_id)
                 msg_list.append(Msg.image(image_url))
-            elif "video/" in m.document.mime_type:
+            elif "video/" in (m.document.mime_type or ""):
                 video_url = await self.cache_file_url(m.document.file_id)
                 msg_list.append(Msg.video(video_url))
+            else:
+                msg_list.append(Msg.text(f"[文件] {m.document.file_name or ''}"))
         if m.caption:
             msg_list.append(Msg.text(m.caption))
-        return msg_list
+        # 熔断期间无法获取文件地址，用文字占位
+        return [
+            Msg.text(MEDIA_HOLDER[s["type"]])
+            if s["type"] in MEDIA_HOLDER and not s["data"]["file"]
+            else s
+            for s in msg_list
+        ]
+
+    @staticmethod
+    def is_file(m: Message) -> bool:
+        """判断消息是否为需要作为文件上传的 document"""
+        if not m.document:
+            return False
+        mime_type = m.document.mime_type or ""
+        return "image/" not in mime_type and "video/" not in mime_type
+
+    @logger.catch
+    async def send_file_to_qq(
+        self,
+        m: Message,
+        user_id: int | None = None,
+        group_id: int | None = None,
+    ):
+        """在后台下载 telegram 文件并上传到 qq 群文件或私聊文件
+
+        Args:
+            m (Message): 传入的消息模型
+            user_id (int | None, optional): 要发送的用户id，默认为 None
+            group_id (int | None, optional): 要发送的群id，默认为 None
+        """
+        doc = m.document
+        name = doc.file_name or doc.file_unique_id
+        if not transfers.allowed(doc.file_size):
+            logger.warning("File too large, skip: {} ({}B)", name, doc.file_size)
+            return
+        if not (url := await self.cache_file_url(doc.file_id)):
+            logger.warning("Failed to get file url, skip: {}", name)
+            return
+
+        async def upload(path: str):
+            if group_id:
+                await self.qq.upload_to_qq(
+                    "upload_group_file",
+                    timeout,
+                    group_id=group_id,
+                    file=path,
+                    name=name,
+                )
+            else:
+                await self.qq.upload_to_qq(
+                    "upload_private_file",
+                    timeout,
+                    user_id=user_id,
+                    file=path,
+                    name=name,
+                )
+
+        timeout = transfers.deadline(doc.file_size)
+
+        transfers.start(name, doc.file_size, url, upload)
 
     @logger.catch
     async def cache_file_url(self, file_id: str, reverse=True) -> str:
@@ -143,7 +220,9 @@ class Tbot:
             str: 文件地址
         """
         if file_id not in db.file_cache:
-            photo_url = (await self.bot.get_file(file_id)).file_path
+            if not (file := await call_tg(self.bot, "get_file", file_id=file_id)):
+                return ""
+            photo_url = file.file_path
             reverse_url = self.base_url[:-3] + photo_url[25:]
             db.file_cache[file_id] = (photo_url, reverse_url)
         return db.file_cache[file_id][reverse]
@@ -1,13 +1,19 @@
-import re
 import sys
-import time
+from collections import OrderedDict
 from functools import partial
 from pathlib import Path
 
 import toml
 from loguru import logger
+from telegram import Bot
+from telegram.error import BadRequest, ChatMigrated, Conflict, Forbidden, InvalidToken
 
+from .breaker import Breakers
+from .log import Sampler, add_sinks
 from .models import Config
+from .record import Recorder
+from .render import MD_TABLE
+from .transfer import Transfers
 
 base_dir = Path(sys.argv[0]).parent.absolute()
 raw_conf = toml.load(base_dir / "config.toml")
@@ -15,14 +21,30 @@ raw_conf["forward"]["u"].update({v: k for k, v in raw_conf["forward"]["u"].items
 raw_conf["forward"]["g"].update({v: k for k, v in raw_conf["forward"]["g"].items()})
 raw_conf["forward"]["a"] = raw_conf["forward"]["u"] | raw_conf["forward"]["g"]
 conf = Config.parse_obj(raw_conf)
-logger.remove()
-logger.add(sys.stderr, colorize=True, format=conf.log_format, level=conf.log_level)
-logger.add(base_dir / f"logs/{time.strftime('%Y-%m-%d')}.log", enqueue=True)
+
+
+def setup_logger(level: str = conf.log_level, file_level: str = conf.log_file_level):
+    """按配置文件设置日志，file_level 为 OFF 时不写入日志文件"""
+    add_sinks(
+        conf.log_format,
+        level,
+        "" if file_level == "OFF" else str(base_dir / "logs/{time:YYYY-MM-DD}.log"),
+        file_level,
+        conf.log_rotation,
+    )
+
+
+setup_logger()
+sampler = Sampler(conf.log_rate, conf.log_sample)
+recorder = Recorder(
+    conf.record_file and str(base_dir / conf.record_file),
+    set(conf.forward.a),
+    conf.tg_token,
+)
 
 
 def escaped_md(text: str = "", extra: bool = False) -> str:
-    escape_chars = r"\_*[]()~`>#+-=|{}.!"
-    new_text = re.sub(f"([{re.escape(escape_chars)}])", r"\\\1", text)
+    new_text = text.translate(MD_TABLE)
     return new_text.strip().replace(".", "·") if extra is True else new_text
 
 
@@ -56,10 +78,12 @@ class Msg:
 
 
 class Database:
-    def __init__(self) -> None:
+    def __init__(self, snapshot_size: int = 1000) -> None:
         self.tg: dict[tuple[int, int], int] = {}
         self.qq: dict[int, tuple[int, int]] = {}
         self.file_cache: dict[str, tuple[str, str]] = {}
+        self.snapshot: OrderedDict[int, tuple[list[dict], dict, str]] = OrderedDict()
+        self.snapshot_size = snapshot_size
         self.sent: bool = False
 
     def set(self, tg_msgid: tuple[int, int], qq_msgid: int) -> None:
@@ -72,8 +96,54 @@ class Database:
     def get_tg_msgid(self, msgid: str) -> tuple[int, int]:
         return self.qq.get(int(msgid), (0, 0))
 
+    def save(
+        self,
+        qq_msgid: int,
+        segments: list[dict],
+        rendered: dict | None = None,
+        origin: str = "qq",
+    ) -> None:
+        """保存已转发消息的快照，超出容量时丢弃最旧的消息
+
+        Args:
+            qq_msgid (int): qq 的消息 id
+            segments (list[dict]): onebot11 标准的消息段列表
+            rendered (dict, optional): 发送到 telegram 的 send_message 参数，默认为空
+            origin (str, optional): 消息来源，"qq" 或 "tg"，默认为 "qq"
+        """
+        self.snapshot[qq_msgid] = (segments, rendered or {}, origin)
+        self.snapshot.move_to_end(qq_msgid)
+        while len(self.snapshot) > self.snapshot_size:
+            self.snapshot.popitem(last=False)
+
+    def load(self, qq_msgid: int) -> tuple[list[dict], dict, str]:
+        """读取消息快照，不在快照中时来源为空字符串"""
+        return self.snapshot.get(qq_msgid, ([], {}, ""))
+
+
+db = Database(conf.snapshot_size)
+breakers = Breakers(conf.circuit)
+transfers = Transfers(conf.transfer)
+# telegram 已正常响应但拒绝了请求，这类错误不计入熔断，也不应重试
+TG_TERMINAL = (BadRequest, ChatMigrated, Conflict, Forbidden, InvalidToken)
+
+
+async def call_tg(bot: Bot, method: str, **kwargs):
+    """经过 tg 与 tg/<method> 熔断器调用 telegram bot api，上传文件不应使用
+
+    Args:
+        bot (Bot): 当前活动的 bot
+        method (str): Bot 的方法名，如 delete_message
 
-db = Database()
+    Returns:
+        api 返回值，熔断期间返回 None
+    """
+    names = (f"tg/{method}", "tg")
+    if not breakers.allow(*names):
+        logger.warning("Circuit open, skip {}", method)
+        return None
+    with breakers.track(*names, ignore=TG_TERMINAL):
+        return await getattr(bot, method)(**kwargs)
 
 
 facemap = {
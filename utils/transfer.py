@@ -0,0 +1,143 @@
+import asyncio
+import os
+from itertools import count
+from tempfile import mkstemp
+from time import monotonic
+from typing import Awaitable, Callable
+
+from httpx import AsyncClient
+from loguru import logger
+
+from .models import FileTransfer
+
+# 取消任务后最多等待对端响应的秒数
+CANCEL_WAIT = 10
+
+
+class Limiter:
+    """全局带宽限制，所有传输共享同一速率"""
+
+    def __init__(self, rate: int):
+        """
+        Args:
+            rate (int): 每秒允许传输的字节数，为 0 时不限制
+        """
+        self.rate, self.next = rate, 0.0
+
+    async def __call__(self, size: int):
+        if self.rate <= 0:
+            return
+        now = monotonic()
+        start = max(self.next, now)
+        self.next = start + size / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class Job:
+    def __init__(self, job_id: int, name: str, size: int):
+        self.id, self.name, self.size = job_id, name, size
+        self.done, self.state = 0, "waiting"
+        self.task: asyncio.Task | None = None
+
+    def __str__(self) -> str:
+        progress = f"{self.done / self.size:.0%}" if self.size else f"{self.done}B"
+        return f"[{self.id}] {self.name}: {self.state} {progress}"
+
+
+class Transfers(dict[int, Job]):
+    """文件传输任务，下载时以流的形式写入临时文件，限制并发数与总带宽"""
+
+    def __init__(self, c: FileTransfer):
+        self.c = c
+        self.max_size = c.max_size * 1048576
+        self.semaphore = asyncio.Semaphore(c.concurrency)
+        self.limiter = Limiter(c.bandwidth * 1024)
+        self.ids = count(1)
+
+    def __str__(self) -> str:
+        return "\n".join(str(job) for job in self.values()) or "No transfer"
+
+    def allowed(self, size: int | None) -> bool:
+        return bool(size) and size <= self.max_size  # type:ignore
+
+    def deadline(self, size: int) -> float:
+        """按最低上传速率估算上传的超时时间，至少 60 秒"""
+        return max(60, size / (self.c.min_rate * 1024))
+
+    def start(
+        self,
+        name: str,
+        size: int,
+        url: str,
+        handler: Callable[[str], Awaitable],
+    ) -> Job:
+        """创建后台传输任务
+
+        Args:
+            name (str): 文件名
+            size (int): 文件大小
+            url (str): 下载地址
+            handler (Callable[[str], Awaitable]): 下载完成后调用，参数为临时文件路径
+
+        Returns:
+            Job: 传输任务
+        """
+        job_id = next(self.ids)
+        job = self[job_id] = Job(job_id, name, size)
+        job.task = asyncio.create_task(self.run(job, url, handler))
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """取消传输任务，已失败的任务则从列表中移除"""
+        if not (job := self.get(job_id)):
+            return False
+        if job.task and not job.task.done():
+            return job.task.cancel()
+        return self.pop(job_id) is not None
+
+    @logger.catch
+    async def run(self, job: Job, url: str, handler: Callable[[str], Awaitable]):
+        fd, path = mkstemp(prefix="q2tg-", dir=self.c.spool or None)
+        os.close(fd)
+        path = os.path.abspath(path)
+        upload: asyncio.Future | None = None
+        try:
+            async with self.semaphore:
+                logger.info("Transfer {}: {}", job.id, job.name)
+                job.state = "downloading"
+                await self.download(job, url, path)
+                job.state = "uploading"
+                upload = asyncio.ensure_future(
+                    asyncio.wait_for(handler(path), self.deadline(job.size))
+                )
+                await asyncio.shield(upload)
+                job.state = "done"
+                logger.success("Transfer {} done: {}", job.id, job.name)
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+            logger.warning("Transfer {} cancelled: {}", job.id, job.name)
+        except Exception as e:
+            job.state = "failed"
+            logger.error("Transfer {} failed: {} {}", job.id, job.name, repr(e))
+        finally:
+            if upload is not None and not upload.done():
+                # 对端可能仍在读取临时文件，等待其响应后再删除，超时则放弃上传
+                await asyncio.wait([upload], timeout=CANCEL_WAIT)
+                upload.cancel()
+            os.remove(path)
+            if job.state != "failed":
+                self.pop(job.id, None)
+
+    async def download(self, job: Job, url: str, path: str):
+        """以流的形式下载到临时文件，超过大小限制时中止"""
+        async with AsyncClient(timeout=30, follow_redirects=True) as client:
+            async with client.stream("GET", url) as r:
+                r.raise_for_status()
+                with open(path, "wb") as f:
+                    async for chunk in r.aiter_bytes(self.c.chunk_size * 1024):
+                        if job.done + len(chunk) > self.max_size:
+                            raise ValueError(f"File exceeds {self.c.max_size}MB")
+                        await self.limiter(len(chunk))
+                        f.write(chunk)
+                        job.done += len(chunk)